@@ -1,17 +1,31 @@
+from contextlib import ExitStack, contextmanager
+from dataclasses import replace
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 import json
 from logging import Logger, FileHandler
+import random
 import re
 from itertools import zip_longest
+import threading
+import time
+from urllib.parse import urlsplit
 
 import requests
 from requests.exceptions import JSONDecodeError, RequestException
 import yaml
 
-from .structure import (General, Request, RequestSection, Structure, TEMPLATE_TO_SPLIT_URL, TEMPLATE_TO_REPLACE_PARAM,
-                        RequestParamsNames, RequestSectionParamsNames, RootParamsNames)
+from .structure import (General, GeneralParamsNames, RateLimit, Request, RequestSection, SendMetadata, Structure,
+                        TEMPLATE_TO_SPLIT_URL, TEMPLATE_TO_REPLACE_PARAM, RateLimitParamsNames, RequestParamsNames,
+                        RequestSectionParamsNames, RootParamsNames)
 
 
 STRUCTURE_FILE = "structure.yml"
+RETRY_STATUS_CODES = (429, 503)
+# 503 may come after the request was processed, so it's retried only for these methods. 429 is retried for all.
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE")
+LIMITER_PARAMS = (RateLimitParamsNames.requests_per_second, RateLimitParamsNames.burst,
+                  RateLimitParamsNames.max_in_flight)
 
 
 class StructureParser:
@@ -40,7 +54,8 @@ class StructureParser:
             data = dict(
                 name=value[RequestParamsNames.name.name],
                 url=value[RequestParamsNames.url.name],
-                method=value[RequestParamsNames.method.name]
+                method=value[RequestParamsNames.method.name],
+                key=key
             )
 
             for section_name in (
@@ -53,16 +68,103 @@ class StructureParser:
                     if keys := section.get(RequestSectionParamsNames.keys.name):
                         section_dict[RequestSectionParamsNames.keys.name] = keys
                     data[section_name.name] = RequestSection(**section_dict)
+            if rate_limit := value.get(RequestParamsNames.rate_limit.name):
+                try:
+                    RateLimit(**rate_limit)     # overrides should be valid on their own
+                except (TypeError, ValueError) as err:
+                    raise ValueError(f'Request "{key}": wrong "{RequestParamsNames.rate_limit.name}" section: {err}')
+                data[RequestParamsNames.rate_limit.name] = rate_limit
             http_requests[key] = Request(**data)
-        if cls.parsed.get(RootParamsNames.general.name):
+        if general := cls.parsed.get(RootParamsNames.general.name):
+            if rate_limit := general.get(GeneralParamsNames.rate_limit.name):
+                try:
+                    RateLimit(**rate_limit)
+                except (TypeError, ValueError) as err:
+                    raise ValueError(f'"{RootParamsNames.general.name}": '
+                                     f'wrong "{GeneralParamsNames.rate_limit.name}" section: {err}')
             return Structure(
                 http_requests=http_requests,
-                general=General(**cls.parsed[RootParamsNames.general.name])
+                general=General(**general)
             )
         return Structure(http_requests)
 
 
+class Limiter:
+    """Token bucket plus max-in-flight semaphore shared by all sends to one host (or of one request)."""
+    def __init__(self, rate_limit: RateLimit):
+        self.rate_limit = rate_limit
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(rate_limit.max_in_flight) if rate_limit.max_in_flight is not None else None
+        self._tokens = float(rate_limit.burst)
+        self._updated = time.monotonic()
+        self._queued = 0
+
+    @contextmanager
+    def slot(self):
+        """Blocks until the request may be sent. Yields queue depth on entry and seconds spent waiting."""
+        start = time.monotonic()
+        with self._lock:
+            queue_depth = self._queued
+            self._queued += 1
+        try:
+            if self._slots:
+                self._slots.acquire()
+            try:
+                self._take_token()
+            except BaseException:
+                if self._slots:
+                    self._slots.release()
+                raise
+        finally:
+            with self._lock:
+                self._queued -= 1
+        try:
+            yield queue_depth, time.monotonic() - start
+        finally:
+            if self._slots:
+                self._slots.release()
+
+    def _take_token(self):
+        rate = self.rate_limit.requests_per_second
+        if not rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate_limit.burst, self._tokens + (now - self._updated) * rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / rate
+            time.sleep(delay)
+
+
+_host_limiters: dict[str, Limiter] = {}
+_request_limiters: dict[tuple[str, str], Limiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiters(url: str, request_object: Request, general_rate_limit: RateLimit) -> list[Limiter]:
+    """Limiters a send should pass through: the request's own one (if it overrides limiting params) and the host's one.
+
+    Every send to the host counts against the host limiter, so overrides can only tighten limits, not add budget."""
+    host = urlsplit(url).netloc.lower()
+    overrides = {key: value for key, value in request_object.rate_limit.items() if key in LIMITER_PARAMS}
+    with _limiters_lock:
+        if host not in _host_limiters:
+            _host_limiters[host] = Limiter(general_rate_limit)
+        limiters = [_host_limiters[host]]
+        if overrides:
+            key = (host, request_object.key)
+            if key not in _request_limiters:
+                _request_limiters[key] = Limiter(RateLimit(**overrides))
+            limiters.insert(0, _request_limiters[key])
+    return limiters
+
+
 def send_request(request_object: Request):
+    request_object.send_metadata = SendMetadata()
     enable_log = True if StructureParser().structure.general.enable_http_log else False
     if enable_log:
         logger = Logger('requests sender')
@@ -86,14 +188,20 @@ def send_request(request_object: Request):
                     f'url: {prepared_request.url}\n'
                     f'Headers: {prepared_request.headers}\n'
                     f'Body: {prepared_request.body}\n')
+    general_rate_limit = StructureParser().structure.general.rate_limit
+    rate_limit = replace(general_rate_limit, **request_object.rate_limit)
+    limiters = get_limiters(prepared_request.url, request_object, general_rate_limit)
     session = requests.session()
     try:
-        response = session.send(prepared_request)
+        response = _send_limited(session, prepared_request, limiters, rate_limit, request_object.send_metadata)
     except RequestException as err:
         if enable_log:
             logger.error(err)
+            logger.info(request_object.send_metadata)
         return str(err)
     else:
+        if enable_log:
+            logger.info(request_object.send_metadata)
         try:
             resp = json.dumps(response.json(), indent=4, ensure_ascii=False)
             if enable_log:
@@ -106,6 +214,59 @@ def send_request(request_object: Request):
             return resp
 
 
+def _send_limited(session: requests.Session, prepared_request: requests.PreparedRequest, limiters: list[Limiter],
+                  rate_limit: RateLimit, metadata: SendMetadata) -> requests.Response:
+    while True:
+        with ExitStack() as stack:
+            for limiter in limiters:
+                queue_depth, wait_time = stack.enter_context(limiter.slot())
+                metadata.queue_depth = max(metadata.queue_depth, queue_depth)
+                metadata.wait_time += wait_time
+            metadata.attempts += 1
+            response = session.send(prepared_request)
+        metadata.status_code = response.status_code
+        if not _is_retryable(response, prepared_request.method) or metadata.attempts > rate_limit.max_retries:
+            return response
+        delay = _retry_delay(response.headers.get("Retry-After"), rate_limit, metadata.attempts)
+        if delay is None:   # the server asks to wait longer than allowed
+            return response
+        metadata.wait_time += delay
+        time.sleep(delay)
+
+
+def _is_retryable(response: requests.Response, method: str) -> bool:
+    if response.status_code == 503:
+        return method.upper() in IDEMPOTENT_METHODS
+    return response.status_code in RETRY_STATUS_CODES
+
+
+def _retry_delay(retry_after: str | None, rate_limit: RateLimit, attempt: int) -> float | None:
+    """Retry-After value (seconds or HTTP date) plus jitter, or full-jitter exponential backoff if it's absent.
+
+    Returns None if Retry-After exceeds "max_backoff": the request mustn't be retried earlier than the server allows."""
+    server_delay = _parse_retry_after(retry_after)
+    if server_delay is None:
+        return random.uniform(0, min(rate_limit.max_backoff, rate_limit.backoff * 2 ** (attempt - 1)))
+    if server_delay > rate_limit.max_backoff:
+        return None
+    return server_delay + random.uniform(0, min(rate_limit.backoff, rate_limit.max_backoff - server_delay))
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdecimal():
+        return float(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
 def _prepare_body(body: RequestSection) -> bytes:
     if body.json:           # prevent sending empty json in request body
         json_template = json.dumps(body.json)
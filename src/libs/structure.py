@@ -23,6 +23,7 @@ class RequestParamsNames(str, Enum):
     headers = "headers"
     query_params = "query_params"
     body = "body"
+    rate_limit = "rate_limit"
 
 
 class NodeParamsNames(str, Enum):
@@ -39,13 +40,59 @@ class RequestSectionParamsNames(str, Enum):
 class GeneralParamsNames(str, Enum):
     enable_http_log = "enable_http_log"
     http_log = "http_log"
+    rate_limit = "rate_limit"
+
+
+class RateLimitParamsNames(str, Enum):
+    requests_per_second = "requests_per_second"
+    burst = "burst"
+    max_in_flight = "max_in_flight"
+    max_retries = "max_retries"
+    backoff = "backoff"
+    max_backoff = "max_backoff"
 
 ########### Data classes ##############
 
+@dataclass(frozen=True)
+class RateLimit:
+    requests_per_second: float = None   # None means no limit
+    burst: int = 1                      # token bucket capacity
+    max_in_flight: int = None           # None means no limit
+    max_retries: int = 0                # retries on 429/503 responses
+    backoff: float = 1.0                # base delay (seconds) for jittered exponential backoff
+    max_backoff: float = 60.0
+
+    def __post_init__(self):
+        if self.requests_per_second is not None and self.requests_per_second <= 0:
+            raise ValueError(f'"{RateLimitParamsNames.requests_per_second.name}" should be positive')
+        if self.burst < 1:
+            raise ValueError(f'"{RateLimitParamsNames.burst.name}" should be at least 1')
+        if self.max_in_flight is not None and self.max_in_flight < 1:
+            raise ValueError(f'"{RateLimitParamsNames.max_in_flight.name}" should be at least 1')
+        for name in (RateLimitParamsNames.max_retries, RateLimitParamsNames.backoff, RateLimitParamsNames.max_backoff):
+            if getattr(self, name.name) < 0:
+                raise ValueError(f'"{name.name}" should not be negative')
+
+
 @dataclass
 class General:
     enable_http_log: bool = False
     http_log: str = HTTP_LOG
+    rate_limit: RateLimit = field(default_factory=RateLimit)
+
+    def __post_init__(self):
+        if self.rate_limit is None:     # empty section in YAML
+            self.rate_limit = RateLimit()
+        elif isinstance(self.rate_limit, dict):
+            self.rate_limit = RateLimit(**self.rate_limit)
+
+
+@dataclass
+class SendMetadata:
+    queue_depth: int = 0        # max number of sends waiting for the same host limiter when this one was queued
+    wait_time: float = 0.0      # seconds spent waiting for the limiter and in retry backoff
+    attempts: int = 0
+    status_code: int = None
 
 
 @dataclass
@@ -83,11 +130,14 @@ class Request:
     name: str
     url: str
     method: str
+    key: str = ""   # unique key of the request in "http_requests" section
     # all sections including URL parts in curl braces, query parameters and headers:
     body: RequestSection = field(default_factory=RequestSection)
     headers: RequestSection = field(default_factory=RequestSection)
     query_params: RequestSection = field(default_factory=RequestSection)
+    rate_limit: dict = field(default_factory=dict)  # optional overrides of "general" rate limit params
     parsed_url_parts: list[RequestParam] = field(init=False)
+    send_metadata: SendMetadata = field(init=False, default_factory=SendMetadata)  # set after every send
 
     def __post_init__(self):
         self.parsed_url_parts = []
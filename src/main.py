@@ -1,17 +1,20 @@
 #!/usr/bin/env python3
+from copy import deepcopy
+
 from PyQt5 import QtGui
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QFrame, QLineEdit, QComboBox, QLabel, QPushButton,
     QGridLayout, QDesktopWidget, QScrollArea, QVBoxLayout, QFormLayout,
     QDialog, QDialogButtonBox, QPlainTextEdit, QSizePolicy
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
 
 from libs.core import StructureParser, send_request
 from libs.structure import Request, RequestParam
 
 
 TITLE = "HTTP requests assistant"
+SENDING_THREADS = 32    # sends mostly wait for network and rate limits, so don't bind the pool size to CPU count
 
 
 class MainWindow(QWidget):
@@ -19,6 +22,7 @@ class MainWindow(QWidget):
         super().__init__()
         self.exit_callback = exit_callback
         self.structure = StructureParser().structure
+        QThreadPool.globalInstance().setMaxThreadCount(SENDING_THREADS)
         self.init_ui()
         self._center()
 
@@ -76,6 +80,7 @@ class HTTPRequestFrame(QFrame):
         self.query_params_mapping = dict.fromkeys(self.http_request_data.query_params.parsed_keys)
         self.body_mapping = dict.fromkeys(self.http_request_data.body.parsed_keys)
         self.headers_mapping = dict.fromkeys(self.http_request_data.headers.parsed_keys)
+        self._senders = set()   # keeps in-flight senders alive until they report the result
         self.init_ui()
 
     def init_ui(self):
@@ -163,16 +168,19 @@ class HTTPRequestFrame(QFrame):
         for key, param in self.http_request_data.body.parsed_keys.items():
             param.current_value = self.body_mapping[key].value
 
-        try:
-            result = send_request(self.http_request_data)
-        except Exception as err:
-            self.show_result(str(err))
-        else:
-            self.show_result(result)
+        # Every send gets its own copy, so the values and metadata of requests in flight aren't overwritten:
+        sender = RequestSender(deepcopy(self.http_request_data))
+        sender.signals.finished.connect(self.show_result)
+        self._senders.add(sender)
+        QThreadPool.globalInstance().start(sender)
 
-    def show_result(self, data: str):
+    def show_result(self, data: str, sender: "RequestSender"):
+        self._senders.discard(sender)
         result_dialogue = QDialog(self)
-        result_dialogue.setWindowTitle(f'Response for "{self.http_request_data.name}"')
+        metadata = sender.http_request_data.send_metadata
+        result_dialogue.setWindowTitle(f'Response for "{self.http_request_data.name}" '
+                                       f'(status: {metadata.status_code}, attempts: {metadata.attempts}, '
+                                       f'waited: {metadata.wait_time:.2f} s, queue: {metadata.queue_depth})')
 
         text_area = QPlainTextEdit(result_dialogue)
         text_area.setReadOnly(True)
@@ -191,6 +199,26 @@ class HTTPRequestFrame(QFrame):
         result_dialogue.show()
 
 
+class RequestSenderSignals(QObject):
+    finished = pyqtSignal(str, object)
+
+
+class RequestSender(QRunnable):
+    """Sends HTTP request in a worker thread, so waiting for rate limits doesn't block the GUI."""
+    def __init__(self, http_request_data: Request):
+        super().__init__()
+        self.http_request_data = http_request_data
+        self.signals = RequestSenderSignals()
+        self.setAutoDelete(False)     # the frame keeps the sender until its result is shown
+
+    def run(self):
+        try:
+            result = send_request(self.http_request_data)
+        except Exception as err:
+            result = str(err)
+        self.signals.finished.emit(result, self)
+
+
 class ParamRow(QFrame):
     """HTTP request parameter value area."""
     def __init__(self, parent, request_param_name: str, request_param: RequestParam):
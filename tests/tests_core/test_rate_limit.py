@@ -0,0 +1,223 @@
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+import time
+
+import pytest
+
+from src.libs import core
+from src.libs.core import (Limiter, StructureParser, get_limiters, send_request, _parse_retry_after, _retry_delay,
+                           _send_limited)
+from src.libs.structure import General, RateLimit, Request, RequestSection, SendMetadata
+
+
+class StubResponse:
+    def __init__(self, status_code, retry_after=None):
+        self.status_code = status_code
+        self.headers = {"Retry-After": retry_after} if retry_after else {}
+
+    def json(self):
+        return {"status": self.status_code}
+
+
+class StubSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sent = []
+
+    def send(self, prepared_request):
+        self.sent.append(prepared_request)
+        return self.responses.pop(0)
+
+
+class StubPreparedRequest:
+    def __init__(self, method="GET"):
+        self.method = method
+
+
+@pytest.fixture(autouse=True)
+def reset_limiters(monkeypatch):
+    monkeypatch.setattr(core, "_host_limiters", {})
+    monkeypatch.setattr(core, "_request_limiters", {})
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(core.time, "sleep", sleeps.append)
+    monkeypatch.setattr(core.random, "uniform", lambda low, high: high)
+    return sleeps
+
+
+def test_general_rate_limit_from_dict():
+    general = General(rate_limit={"requests_per_second": 2, "max_in_flight": 1})
+    assert general.rate_limit == RateLimit(requests_per_second=2, max_in_flight=1)
+
+
+def test_general_empty_rate_limit(monkeypatch):
+    parsed = {"general": {"rate_limit": None},
+              "http_requests": {"req": {"name": "Req", "url": "http://example.it", "method": "get"}}}
+    monkeypatch.setattr(StructureParser, "parsed", parsed)
+    assert StructureParser._prepare().general.rate_limit == RateLimit()
+
+
+def test_limiter_burst_then_throttle():
+    limiter = Limiter(RateLimit(requests_per_second=20, burst=2))
+    start = time.monotonic()
+    for _ in range(3):
+        with limiter.slot():
+            pass
+    assert time.monotonic() - start >= 0.04
+
+
+def test_limiter_no_limits():
+    limiter = Limiter(RateLimit())
+    with limiter.slot() as (queue_depth, wait_time):
+        assert queue_depth == 0
+        assert wait_time < 0.01
+
+
+def test_limiter_per_host():
+    general = RateLimit(requests_per_second=1)
+    request = Request(name="Req", url="", method="get")
+    host_limiter, = get_limiters("http://example.it/a", request, general)
+    assert get_limiters("http://EXAMPLE.it/b?c=d", request, general) == [host_limiter]
+    assert get_limiters("http://example.com/a", request, general) != [host_limiter]
+
+
+def test_limiter_override_shares_host_limiter():
+    general = RateLimit(requests_per_second=5, max_in_flight=2)
+    plain = Request(name="Plain", url="", method="get")
+    strict = Request(name="Strict", url="", method="get", rate_limit={"requests_per_second": 1, "max_retries": 3})
+    host_limiter, = get_limiters("http://example.it/a", plain, general)
+    request_limiter, strict_host_limiter = get_limiters("http://example.it/b", strict, general)
+    assert strict_host_limiter is host_limiter
+    assert request_limiter.rate_limit == RateLimit(requests_per_second=1)
+
+
+def test_limiter_per_request_key():
+    first = Request(name="Same", url="", method="get", key="first", rate_limit={"requests_per_second": 1})
+    second = Request(name="Same", url="", method="get", key="second", rate_limit={"requests_per_second": 2})
+    first_limiter, _ = get_limiters("http://example.it/a", first, RateLimit())
+    second_limiter, _ = get_limiters("http://example.it/a", second, RateLimit())
+    assert first_limiter.rate_limit == RateLimit(requests_per_second=1)
+    assert second_limiter.rate_limit == RateLimit(requests_per_second=2)
+
+
+def test_limiter_retry_override_adds_no_limiter():
+    request = Request(name="Retry", url="", method="get", rate_limit={"max_retries": 3})
+    assert len(get_limiters("http://example.it/a", request, RateLimit())) == 1
+
+
+def test_parse_retry_after():
+    assert _parse_retry_after("120") == 120
+    assert _parse_retry_after(None) is None
+    assert _parse_retry_after("garbage") is None
+    date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 28 <= _parse_retry_after(date) <= 30
+
+
+def test_retry_delay():
+    rate_limit = RateLimit(backoff=1, max_backoff=10)
+    assert 5 <= _retry_delay("5", rate_limit, 1) <= 6
+    assert _retry_delay("100", rate_limit, 1) is None
+    assert 9 <= _retry_delay("9", rate_limit, 1) <= 10
+    assert 0 <= _retry_delay(None, rate_limit, 3) <= 4
+
+
+@pytest.mark.parametrize("params", [
+    {"burst": 0},
+    {"requests_per_second": 0},
+    {"requests_per_second": -1},
+    {"max_in_flight": 0},
+    {"max_retries": -1},
+])
+def test_rate_limit_validation(params):
+    with pytest.raises(ValueError):
+        RateLimit(**params)
+
+
+@pytest.mark.parametrize("rate_limit", [{"burst": 0}, {"unknown": 1}])
+def test_request_rate_limit_validated_on_parse(monkeypatch, rate_limit):
+    parsed = {"http_requests": {"req": {"name": "Req", "url": "http://example.it", "method": "get",
+                                        "rate_limit": rate_limit}}}
+    monkeypatch.setattr(StructureParser, "parsed", parsed)
+    with pytest.raises(ValueError, match='"req"'):
+        StructureParser._prepare()
+
+
+@pytest.mark.parametrize("rate_limit", [{"burst": 0}, {"rps": 1}])
+def test_general_rate_limit_validated_on_parse(monkeypatch, rate_limit):
+    parsed = {"general": {"rate_limit": rate_limit}, "http_requests": {}}
+    monkeypatch.setattr(StructureParser, "parsed", parsed)
+    with pytest.raises(ValueError, match='"general": wrong "rate_limit" section'):
+        StructureParser._prepare()
+
+
+@pytest.mark.parametrize("status_code", [429, 503])
+def test_send_limited_retries(sleeps, status_code):
+    session = StubSession(StubResponse(status_code), StubResponse(status_code, "2"), StubResponse(200))
+    metadata = SendMetadata()
+    rate_limit = RateLimit(max_retries=3, backoff=1)
+    response = _send_limited(session, StubPreparedRequest(), [Limiter(rate_limit)], rate_limit, metadata)
+    assert response.status_code == 200
+    assert sleeps == [1, 3]
+    assert metadata.attempts == 3
+    assert metadata.status_code == 200
+    assert metadata.wait_time >= 4
+
+
+def test_send_limited_stops_after_max_retries(sleeps):
+    session = StubSession(*(StubResponse(429) for _ in range(3)))
+    metadata = SendMetadata()
+    rate_limit = RateLimit(max_retries=2, backoff=1)
+    response = _send_limited(session, StubPreparedRequest(), [Limiter(rate_limit)], rate_limit, metadata)
+    assert response.status_code == 429
+    assert sleeps == [1, 2]
+    assert metadata.attempts == 3
+    assert metadata.status_code == 429
+
+
+@pytest.mark.parametrize("response, method", [
+    (StubResponse(500), "GET"),
+    (StubResponse(200), "GET"),
+    (StubResponse(503), "POST"),
+    (StubResponse(429, "120"), "GET"),
+])
+def test_send_limited_no_retry(sleeps, response, method):
+    metadata = SendMetadata()
+    rate_limit = RateLimit(max_retries=3)
+    assert _send_limited(StubSession(response), StubPreparedRequest(method), [Limiter(rate_limit)], rate_limit,
+                         metadata) is response
+    assert sleeps == []
+    assert metadata.attempts == 1
+    assert metadata.status_code == response.status_code
+
+
+def test_send_request_merges_overrides(monkeypatch, sleeps):
+    parsed = {
+        "general": {"rate_limit": {"requests_per_second": 5, "burst": 5, "max_retries": 1}},
+        "http_requests": {"req": {"name": "Req", "url": "http://example.it/", "method": "get",
+                                  "rate_limit": {"max_retries": 2, "max_in_flight": 1}}},
+    }
+    monkeypatch.setattr(StructureParser, "parsed", parsed)
+    monkeypatch.setattr(StructureParser, "_structure", None)
+    request = StructureParser.structure.http_requests["req"]
+    assert request.rate_limit == {"max_retries": 2, "max_in_flight": 1}
+    session = StubSession(StubResponse(429), StubResponse(429), StubResponse(200))
+    monkeypatch.setattr(core.requests, "session", lambda: session)
+    assert '"status": 200' in send_request(request)
+    assert request.send_metadata.attempts == 3
+    request_limiter, host_limiter = core._request_limiters[("example.it", "req")], core._host_limiters["example.it"]
+    assert request_limiter.rate_limit == RateLimit(max_in_flight=1)
+    assert host_limiter.rate_limit == RateLimit(requests_per_second=5, burst=5, max_retries=1)
+
+
+def test_send_request_resets_metadata(monkeypatch):
+    monkeypatch.setattr(StructureParser, "parsed", {"http_requests": {}})
+    monkeypatch.setattr(StructureParser, "_structure", None)
+    request = Request(name="Req", url="http://example.it/", method="post",
+                      body=RequestSection(json={"a": 1}, keys={"b": {"text": "1"}}))
+    request.send_metadata = SendMetadata(attempts=3, status_code=429)
+    with pytest.raises(KeyError):
+        send_request(request)
+    assert request.send_metadata == SendMetadata()